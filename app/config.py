@@ -1,30 +1,66 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 
-load_dotenv()
-
 class Settings:
-    """Application configuration settings"""
-    
-    # Cohere Configuration
-    COHERE_API_KEY: str = os.getenv("COHERE_API_KEY", "")
-    COHERE_MODEL: str = os.getenv("COHERE_MODEL", "command-r-08-2024")
-    COHERE_TEMPERATURE: float = float(os.getenv("COHERE_TEMPERATURE", "0.7"))
-    COHERE_MAX_TOKENS: int = int(os.getenv("COHERE_MAX_TOKENS", "200"))
-    
-    # Cohere Embedding Configuration
-    COHERE_EMBEDDING_MODEL: str = os.getenv("COHERE_EMBEDDING_MODEL", "embed-english-v3.0")
-    EMBEDDING_INPUT_TYPE: str = os.getenv("EMBEDDING_INPUT_TYPE", "search_document")
-    
-    # Vector Store Configuration
-    VECTOR_STORE_ENABLED: bool = os.getenv("VECTOR_STORE_ENABLED", "true").lower() == "true"
-    TOP_K_RESULTS: int = int(os.getenv("TOP_K_RESULTS", "3"))
+    """Application configuration settings, read from the environment on construction"""
     
-    # Translation Configuration
-    TRANSLATION_ENABLED: bool = os.getenv("TRANSLATION_ENABLED", "true").lower() == "true"
-    
-    # Application Settings
-    DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
+    def __init__(self):
+        # Cohere Configuration
+        self.COHERE_API_KEY: str = os.getenv("COHERE_API_KEY", "")
+        self.COHERE_MODEL: str = os.getenv("COHERE_MODEL", "command-r-08-2024")
+        self.COHERE_TEMPERATURE: float = float(os.getenv("COHERE_TEMPERATURE", "0.7"))
+        self.COHERE_MAX_TOKENS: int = int(os.getenv("COHERE_MAX_TOKENS", "200"))
+        
+        # Cohere HTTP Connection Pool
+        self.COHERE_MAX_CONNECTIONS: int = int(os.getenv("COHERE_MAX_CONNECTIONS", "64"))
+        self.COHERE_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("COHERE_MAX_KEEPALIVE_CONNECTIONS", "32"))
+        self.COHERE_TIMEOUT: float = float(os.getenv("COHERE_TIMEOUT", "20.0"))
+        self.COHERE_CONNECT_TIMEOUT: float = float(os.getenv("COHERE_CONNECT_TIMEOUT", "2.0"))
+        
+        # Cohere Embedding Configuration
+        self.COHERE_EMBEDDING_MODEL: str = os.getenv("COHERE_EMBEDDING_MODEL", "embed-english-v3.0")
+        self.EMBEDDING_INPUT_TYPE: str = os.getenv("EMBEDDING_INPUT_TYPE", "search_document")
+        # Cohere accepts at most 96 texts per embed request
+        self.COHERE_EMBED_BATCH_SIZE: int = min(96, int(os.getenv("COHERE_EMBED_BATCH_SIZE", "96")))
+        self.COHERE_EMBED_CONCURRENCY: int = int(os.getenv("COHERE_EMBED_CONCURRENCY", "4"))
+        
+        # Vector Store Configuration
+        self.VECTOR_STORE_ENABLED: bool = os.getenv("VECTOR_STORE_ENABLED", "true").lower() == "true"
+        self.TOP_K_RESULTS: int = int(os.getenv("TOP_K_RESULTS", "3"))
+        # Corpora at least this large use a compressed IVF-PQ index instead of an exhaustive fp16 scan
+        self.VECTOR_INDEX_IVF_MIN_SIZE: int = int(os.getenv("VECTOR_INDEX_IVF_MIN_SIZE", "10000"))
+        self.VECTOR_INDEX_NPROBE: int = int(os.getenv("VECTOR_INDEX_NPROBE", "16"))
+        self.QUERY_EMBED_CACHE_SIZE: int = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "1024"))
+        # Directory for persisted FAISS indexes (relative to the project root); empty disables
+        self.VECTOR_STORE_CACHE_PATH: str = os.getenv("VECTOR_STORE_CACHE_PATH", os.path.join("app", "data", "index_cache"))
+        # Half the cores by default, leaving the rest for the event loop and HTTP clients
+        self.FAISS_NUM_THREADS: int = int(os.getenv("FAISS_NUM_THREADS", str(max(1, (os.cpu_count() or 2) // 2))))
+        
+        # Translation Configuration
+        self.TRANSLATION_ENABLED: bool = os.getenv("TRANSLATION_ENABLED", "true").lower() == "true"
+        self.TRANSLATION_CONCURRENCY: int = int(os.getenv("TRANSLATION_CONCURRENCY", "4"))
+        self.TRANSLATION_CACHE_SIZE: int = int(os.getenv("TRANSLATION_CACHE_SIZE", "1024"))
+        self.TRANSLATION_CACHE_TTL_SECONDS: int = int(os.getenv("TRANSLATION_CACHE_TTL_SECONDS", str(24 * 3600)))
+        
+        # Cache Configuration
+        self.CACHE_MAX_SIZE: int = int(os.getenv("CACHE_MAX_SIZE", "100000"))
+        self.USER_PROFILE_TTL_SECONDS: int = int(os.getenv("USER_PROFILE_TTL_SECONDS", str(30 * 24 * 3600)))
+        
+        # Application Settings
+        self.DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
+
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Load .env (once per process) and build the settings
+    
+    Modules bind the module-level settings instance at import, so tests
+    override individual attributes on it (e.g. patch.object) instead of
+    rebuilding it.
+    """
+    load_dotenv()
+    return Settings()
 
+settings = get_settings()
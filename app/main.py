@@ -7,8 +7,7 @@ from app.services.zodiac import get_zodiac_sign
 from app.services.insight import generate_insight
 from app.services.cache import cache_service
 from app.services.vector_store import vector_store
-from dotenv import load_dotenv
-load_dotenv()
+from app.services.cohere_client import close_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +25,7 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("Closing connections...")
     await cache_service.close()
+    await close_client()
     logger.info("Connections closed")
 
 app = FastAPI(
@@ -57,8 +57,8 @@ async def predict_insight(
         # Get zodiac sign
         zodiac_sign = get_zodiac_sign(details.birth_date)
         
-        # Generate insight (async)
-        insight_text, cache_hit = await generate_insight(
+        # Generate insight (async); the user's updated score comes back with it
+        insight_text, cache_hit, user_score = await generate_insight(
             name=details.name,
             zodiac=zodiac_sign,
             language=language,
@@ -66,12 +66,6 @@ async def predict_insight(
             birth_details=details
         )
         
-        # Get user score
-        user_score = None
-        user_profile = await cache_service.get_user_profile(user_id)
-        if user_profile:
-            user_score = user_profile.get("score", 0)
-        
         return InsightResponse(
             zodiac=zodiac_sign,
             insight=insight_text,
@@ -1,8 +1,11 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import date
 from typing import Optional
 
 class BirthDetails(BaseModel):
+    # Immutable, and unknown fields are dropped without extra validation work
+    model_config = ConfigDict(frozen=True, extra="ignore", str_strip_whitespace=True)
+    
     name: str
     birth_date: date
     birth_time: str  # Keeping as string for simplicity, could be time
@@ -13,6 +16,8 @@ class BirthDetails(BaseModel):
     user_id: Optional[str] = Field(None, description="Optional user ID for personalization")
 
 class InsightResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+    
     zodiac: str
     insight: str
     language: str = "en"
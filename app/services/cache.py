@@ -1,31 +1,137 @@
+import asyncio
+import heapq
+import time
+from collections import OrderedDict, deque
 from datetime import datetime, date
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from typing import Optional, Dict, Any, Awaitable, Callable, Hashable, List, Tuple
 import uuid
+from app.config import settings
+
+# Number of recent insights kept per user profile
+PAST_INSIGHTS_LIMIT = 10
+
+
+@lru_cache(maxsize=1)
+def _today_bucket(minute: int) -> date:
+    """Today's date, memoized per wall-clock minute (time.time() // 60)"""
+    return date.today()
+
+
+def today() -> date:
+    """
+    Get today's date, reusing one date object per minute
+    
+    Timezone offsets are whole minutes, so a minute never spans local midnight.
+    """
+    return _today_bucket(int(time.time() // 60))
 
 class AsyncCacheService:
-    """Simple in-memory cache service for insights and user data"""
+    """
+    Two-tier in-memory cache service for insights and user data
+    
+    Daily insights live in a dict holding a single day's entries (one per
+    zodiac sign and audience), replaced wholesale when a new day is written.
+    User profiles live in a size-bounded LRU with per-entry expiry; a heap
+    ordered by expiry lets expired profiles be dropped without scanning.
+    """
     
-    def __init__(self):
-        self._cache: Dict[str, Any] = {}
+    def __init__(self, maxsize: Optional[int] = None):
+        # Buckets are created on first write (None until then) so idle caches stay cheap
+        # (zodiac, audience, date ordinal) -> insight, for the day in _daily_date_ordinal only
+        self._daily: Optional[Dict[Tuple[str, Hashable, int], str]] = None
+        self._daily_date_ordinal: Optional[int] = None
+        # user_id -> (expires_at on the time.monotonic() clock, profile), oldest first
+        self._profiles: "Optional[OrderedDict[str, Tuple[float, Dict[str, Any]]]]" = None
+        # (expires_at, user_id) for every profile write; entries for since-replaced
+        # or evicted profiles are skipped when popped
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._maxsize = maxsize if maxsize is not None else settings.CACHE_MAX_SIZE
+        self._lock = asyncio.Lock()
+        # key -> future for a computation currently in progress (see single_flight)
+        self._inflight: Optional[Dict[Hashable, asyncio.Future]] = None
+    
+    async def single_flight(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run factory once per key among concurrent callers
+        
+        The first caller for a key runs factory(); callers arriving while it is
+        in flight await the same result (or exception) instead of starting their
+        own. If the first caller is cancelled, its followers retry rather than
+        inheriting a cancellation they never asked for. No lock is needed since
+        the event loop runs one coroutine at a time.
+        
+        Args:
+            key: Identifies the computation (e.g. a daily insight key)
+            factory: Zero-argument callable returning the awaitable to run
+            
+        Returns:
+            Result of the shared computation
+        """
+        if self._inflight is None:
+            self._inflight = {}
+        future = self._inflight.get(key)
+        while future is not None:
+            # wait() neither cancels the shared future when this follower is
+            # cancelled nor raises when the future is, so any CancelledError
+            # here is the follower's own
+            await asyncio.wait((future,))
+            if not future.cancelled():
+                return future.result()
+            # The leader was cancelled and its key is gone; the first retrier
+            # becomes the new leader
+            future = self._inflight.get(key)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unobserved failure isn't logged twice
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
     
-    async def get_daily_insight(self, zodiac_sign: str, target_date: Optional[date] = None) -> Optional[str]:
+    async def get_daily_insight(
+        self,
+        zodiac_sign: str,
+        target_date: Optional[date] = None,
+        audience: Hashable = None
+    ) -> Optional[str]:
         """
         Get cached daily insight for a zodiac sign
         
         Args:
             zodiac_sign: Zodiac sign
             target_date: Target date (defaults to today)
+            audience: Who the insight was written for (None for a generic insight);
+                personalized text must never be served to another audience
             
         Returns:
             Cached insight or None if not found
         """
+        if self._daily is None:
+            return None
         if target_date is None:
-            target_date = date.today()
+            target_date = today()
         
-        cache_key = f"insight:daily:{zodiac_sign}:{target_date.isoformat()}"
-        return self._cache.get(cache_key)
+        return self._daily.get((zodiac_sign, audience, target_date.toordinal()))
     
-    async def set_daily_insight(self, zodiac_sign: str, insight: str, target_date: Optional[date] = None):
+    async def set_daily_insight(
+        self,
+        zodiac_sign: str,
+        insight: str,
+        target_date: Optional[date] = None,
+        audience: Hashable = None
+    ):
         """
         Cache daily insight for a zodiac sign
         
@@ -33,25 +139,58 @@ class AsyncCacheService:
             zodiac_sign: Zodiac sign
             insight: Insight text to cache
             target_date: Target date (defaults to today)
+            audience: Who the insight was written for (None for a generic insight)
         """
         if target_date is None:
-            target_date = date.today()
+            target_date = today()
         
-        cache_key = f"insight:daily:{zodiac_sign}:{target_date.isoformat()}"
-        self._cache[cache_key] = insight
+        date_ordinal = target_date.toordinal()
+        # Only the latest day is kept: writing a later day drops the earlier day's
+        # insights, and writes for an earlier day (e.g. a miss that started
+        # before midnight) are not cached
+        if self._daily_date_ordinal is None or date_ordinal > self._daily_date_ordinal:
+            self._daily = {}
+            self._daily_date_ordinal = date_ordinal
+        elif date_ordinal < self._daily_date_ordinal:
+            return
+        self._daily[(zodiac_sign, audience, date_ordinal)] = insight
+        # Personalized entries grow with users, so bound the day like the profile LRU
+        while len(self._daily) > self._maxsize:
+            del self._daily[next(iter(self._daily))]
     
     async def get_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
         """
         Get cached user profile
         
+        The live cached dict is returned, not a copy, and update_user_score /
+        record_user_insight rely on this to mutate profiles in place. A
+        serializing backend (e.g. Redis) must re-add the set_user_profile
+        write-back in those methods.
+        
         Args:
             user_id: User identifier
             
         Returns:
             User profile dict or None if not found
         """
-        cache_key = f"user:profile:{user_id}"
-        return self._cache.get(cache_key)
+        if self._profiles is None:
+            return None
+        self._evict_expired(time.monotonic())
+        entry = self._profiles.get(user_id)
+        if entry is None:
+            return None
+        self._profiles.move_to_end(user_id)
+        return entry[1]
+    
+    def _evict_expired(self, now: float):
+        """Drop profiles whose expiry has passed, popping them off the expiry heap"""
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, user_id = heapq.heappop(heap)
+            entry = self._profiles.get(user_id)
+            # Only evict if this heap entry is for the profile currently stored
+            if entry is not None and entry[0] == expires_at:
+                del self._profiles[user_id]
     
     async def set_user_profile(self, user_id: str, profile: Dict[str, Any]):
         """
@@ -61,8 +200,26 @@ class AsyncCacheService:
             user_id: User identifier
             profile: User profile data
         """
-        cache_key = f"user:profile:{user_id}"
-        self._cache[cache_key] = profile
+        async with self._lock:
+            if self._profiles is None:
+                self._profiles = OrderedDict()
+            now = time.monotonic()
+            self._evict_expired(now)
+            self._stamp_profile(user_id, profile, now)
+            self._profiles.move_to_end(user_id)
+            # Evict least recently used profiles once over capacity
+            while len(self._profiles) > self._maxsize:
+                self._profiles.popitem(last=False)
+    
+    def _stamp_profile(self, user_id: str, profile: Dict[str, Any], now: float):
+        """Store a profile with a fresh TTL and record its expiry on the heap"""
+        expires_at = now + settings.USER_PROFILE_TTL_SECONDS
+        self._profiles[user_id] = (expires_at, profile)
+        heapq.heappush(self._expiry_heap, (expires_at, user_id))
+        # Rebuild once stale entries (replaced, refreshed or LRU-evicted profiles) dominate the heap
+        if len(self._expiry_heap) > 2 * len(self._profiles) + 64:
+            self._expiry_heap = [(expires_at, user_id) for user_id, (expires_at, _) in self._profiles.items()]
+            heapq.heapify(self._expiry_heap)
     
     async def create_user_profile(
         self,
@@ -91,6 +248,7 @@ class AsyncCacheService:
         Returns:
             Created user profile
         """
+        now_iso = datetime.now().isoformat()
         profile = {
             "user_id": user_id,
             "name": name,
@@ -99,9 +257,9 @@ class AsyncCacheService:
             "birth_place": birth_place,
             "score": 0,
             "insights_count": 0,
-            "past_insights": [],
-            "created_at": datetime.now().isoformat(),
-            "last_updated": datetime.now().isoformat()
+            "past_insights": deque(maxlen=PAST_INSIGHTS_LIMIT),
+            "created_at": now_iso,
+            "last_updated": now_iso
         }
         
         if latitude is not None:
@@ -114,25 +272,33 @@ class AsyncCacheService:
         await self.set_user_profile(user_id, profile)
         return profile
     
-    async def update_user_score(self, user_id: str, score_delta: float = 1.0):
+    async def update_user_score(self, user_id: str, score_delta: float = 1.0) -> float:
         """
         Update user's preference score
         
         Args:
             user_id: User identifier
             score_delta: Amount to add to score
+            
+        Returns:
+            The user's updated score
         """
+        now_iso = datetime.now().isoformat()
         profile = await self.get_user_profile(user_id)
         if profile:
+            # Profiles are cached by reference, so mutating in place is enough;
+            # only the TTL needs restarting, as the profile was just active
             profile["score"] = profile.get("score", 0) + score_delta
-            profile["last_updated"] = datetime.now().isoformat()
-            await self.set_user_profile(user_id, profile)
-        else:
-            await self.set_user_profile(user_id, {
-                "score": score_delta,
-                "last_updated": datetime.now().isoformat(),
-                "insights_count": 0
-            })
+            profile["last_updated"] = now_iso
+            self._stamp_profile(user_id, profile, time.monotonic())
+            return profile["score"]
+        
+        await self.set_user_profile(user_id, {
+            "score": score_delta,
+            "last_updated": now_iso,
+            "insights_count": 0
+        })
+        return score_delta
     
     async def record_user_insight(
         self,
@@ -160,6 +326,7 @@ class AsyncCacheService:
             latitude: Optional latitude (stored if profile doesn't exist)
             longitude: Optional longitude (stored if profile doesn't exist)
         """
+        now_iso = datetime.now().isoformat()
         profile = await self.get_user_profile(user_id)
         if not profile:
             # Create new profile with birth details if provided
@@ -167,9 +334,9 @@ class AsyncCacheService:
                 "user_id": user_id,
                 "score": 0,
                 "insights_count": 0,
-                "past_insights": [],
+                "past_insights": deque(maxlen=PAST_INSIGHTS_LIMIT),
                 "preferred_zodiac": zodiac,
-                "created_at": datetime.now().isoformat()
+                "created_at": now_iso
             }
             
             # Store birth details if provided
@@ -185,30 +352,46 @@ class AsyncCacheService:
                 profile["latitude"] = latitude
             if longitude is not None:
                 profile["longitude"] = longitude
+            
+            await self.set_user_profile(user_id, profile)
+        else:
+            # Activity on an existing profile restarts its TTL
+            self._stamp_profile(user_id, profile, time.monotonic())
         
+        # Profiles are cached by reference, so the updates below need no write-back
         profile["insights_count"] = profile.get("insights_count", 0) + 1
-        past_insights = profile.get("past_insights", [])
+        past_insights = profile.get("past_insights")
+        if not isinstance(past_insights, deque):
+            # Profiles stored via set_user_profile may carry a plain list
+            past_insights = deque(past_insights or (), maxlen=PAST_INSIGHTS_LIMIT)
+            profile["past_insights"] = past_insights
         past_insights.append({
             "zodiac": zodiac,
             "insight": insight,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso
         })
-        profile["past_insights"] = past_insights[-10:]
-        profile["last_updated"] = datetime.now().isoformat()
-        
-        await self.set_user_profile(user_id, profile)
+        profile["last_updated"] = now_iso
     
     async def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
+        daily_keys = len(self._daily) if self._daily is not None else 0
+        profile_keys = len(self._profiles) if self._profiles is not None else 0
         return {
             "cache_enabled": True,
             "cache_backend": "in-memory",
-            "total_keys": len(self._cache)
+            "total_keys": daily_keys + profile_keys,
+            "daily_insight_keys": daily_keys,
+            "user_profile_keys": profile_keys,
+            "max_size": self._maxsize
         }
     
     async def clear_cache(self):
         """Clear all caches"""
-        self._cache.clear()
+        async with self._lock:
+            self._daily = None
+            self._daily_date_ordinal = None
+            self._profiles = None
+            self._expiry_heap = []
     
     async def close(self):
         """Close cache (no-op for in-memory cache)"""
@@ -0,0 +1,49 @@
+import logging
+from typing import Optional
+import cohere
+import httpx
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Process-wide client shared by the LLM, translation and vector store services
+_client: Optional[cohere.AsyncClient] = None
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> Optional[cohere.AsyncClient]:
+    """
+    Get the shared Cohere client, creating it on first use
+
+    All services go through one keep-alive connection pool, so a request that
+    embeds, generates and translates reuses warm TLS connections throughout.
+    Call this at use time rather than holding the result: close_client() drops
+    the client at shutdown, and the next call here creates a fresh one.
+
+    Returns:
+        Shared Cohere client, or None if COHERE_API_KEY is not set or setup fails
+    """
+    global _client, _http_client
+    if _client is None and settings.COHERE_API_KEY:
+        try:
+            _http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.COHERE_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.COHERE_MAX_KEEPALIVE_CONNECTIONS
+                ),
+                timeout=httpx.Timeout(settings.COHERE_TIMEOUT, connect=settings.COHERE_CONNECT_TIMEOUT)
+            )
+            _client = cohere.AsyncClient(api_key=settings.COHERE_API_KEY, httpx_client=_http_client)
+        except Exception as e:
+            logger.warning(f"Failed to initialize Cohere client: {e}")
+            _http_client = None
+    return _client
+
+
+async def close_client():
+    """Close the shared client's pooled HTTP connections"""
+    global _client, _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+    _client = None
+    _http_client = None
@@ -1,84 +1,69 @@
 import logging
+import re
 from datetime import date
-from typing import Optional
+from typing import Optional, Tuple
 from app.services.llm_service import llm_service
-from app.services.cache import cache_service
+from app.services.cache import cache_service, today
 from app.services.vector_store import vector_store
-from app.services.translation import translation_service
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
-async def generate_insight(
+# Translation is only wired in (and its Cohere client created) when enabled
+if settings.TRANSLATION_ENABLED:
+    from app.services.translation import translation_service
+    _translate = translation_service.translate
+else:
+    async def _translate(text: str, target_lang: str) -> str:
+        return text
+
+# Keywords that hint at a user's interests, grouped by theme (in query order)
+THEME_KEYWORDS: dict[str, frozenset[str]] = {
+    "career": frozenset({"career", "work", "job", "professional"}),
+    "love": frozenset({"love", "relationship", "partner", "romance"}),
+    "health": frozenset({"health", "wellness", "energy", "body"}),
+    "finance": frozenset({"finance", "money", "financial", "wealth"}),
+}
+# Substring match (no word boundaries), longest keywords first
+_THEME_PATTERN = re.compile(
+    "|".join(
+        re.escape(keyword)
+        for keyword in sorted(frozenset().union(*THEME_KEYWORDS.values()), key=lambda k: (-len(k), k))
+    ),
+    re.IGNORECASE
+)
+
+
+def _extract_themes(text: str) -> list[str]:
+    """Return the themes mentioned in text, in THEME_KEYWORDS order"""
+    matched = {match.lower() for match in _THEME_PATTERN.findall(text)}
+    return [theme for theme, keywords in THEME_KEYWORDS.items() if not matched.isdisjoint(keywords)]
+
+
+async def _generate_daily_insight(
     name: str,
     zodiac: str,
-    language: str = "en",
-    user_id: Optional[str] = None,
-    target_date: Optional[date] = None,
-    birth_details: Optional[any] = None
-) -> tuple[str, bool]:
+    user_profile: Optional[dict],
+    target_date: date,
+    audience: Tuple[str, str]
+) -> str:
     """
-    Generate personalized astrological insight (async)
-    
-    This function orchestrates:
-    1. Cache lookup
-    2. User profile retrieval
-    3. Vector store retrieval for context
-    4. LLM generation
-    5. Translation (if needed)
-    6. Cache storage
+    Generate a fresh insight for a zodiac sign and store it in the daily cache
     
     Args:
         name: User's name
         zodiac: Zodiac sign
-        language: Target language code (default: "en")
-        user_id: Optional user ID for personalization
-        target_date: Optional target date (defaults to today)
-        birth_details: Optional birth details object (BirthDetails model)
+        user_profile: Optional cached profile of the requesting user
+        target_date: Date the insight is generated for
+        audience: Daily cache audience the insight is stored under
         
     Returns:
-        Tuple of (insight_text, cache_hit)
+        Untranslated insight text
     """
-    if target_date is None:
-        target_date = date.today()
-    
-    # Check cache first
-    cached_insight = ""
-    # await cache_service.get_daily_insight(zodiac, target_date)
-    if cached_insight:
-        logger.info(f"Cache hit for {zodiac} on {target_date}")
-        
-        # Translate if needed
-        if language != "en":
-            cached_insight = translation_service.translate(cached_insight, language)
-        
-        # Record user interaction
-        if user_id:
-            # Pass birth details if available
-            kwargs = {"user_id": user_id, "zodiac": zodiac, "insight": cached_insight}
-            if birth_details:
-                kwargs.update({
-                    "name": birth_details.name,
-                    "birth_date": birth_details.birth_date,
-                    "birth_time": birth_details.birth_time,
-                    "birth_place": birth_details.birth_place,
-                    "latitude": birth_details.latitude,
-                    "longitude": birth_details.longitude
-                })
-            await cache_service.record_user_insight(**kwargs)
-            await cache_service.update_user_score(user_id, 0.5)  # Lower score for cached insights
-        
-        return cached_insight, True
-    
-    # Cache miss - generate new insight
     logger.info(f"Generating new insight for {name} ({zodiac})")
     
-    # Retrieve user profile for personalization
-    user_profile = None
-    if user_id:
-        user_profile = await cache_service.get_user_profile(user_id)
-        if user_profile:
-            logger.info(f"Using user profile for personalization (score: {user_profile.get('score', 0)}, insights: {user_profile.get('insights_count', 0)})")
+    if user_profile:
+        logger.info(f"Using user profile for personalization (score: {user_profile.get('score', 0)}, insights: {user_profile.get('insights_count', 0)})")
     
     # Retrieve context from vector store
     context_texts = []
@@ -96,15 +81,7 @@ async def generate_insight(
                     # Build a more personalized query using keywords from past insights
                     recent_insight = past_insights[-1].get("insight", "")
                     # Extract key words that might indicate user interests (career, love, health, etc.)
-                    query_keywords = []
-                    if any(word in recent_insight.lower() for word in ["career", "work", "job", "professional"]):
-                        query_keywords.append("career")
-                    if any(word in recent_insight.lower() for word in ["love", "relationship", "partner", "romance"]):
-                        query_keywords.append("love")
-                    if any(word in recent_insight.lower() for word in ["health", "wellness", "energy", "body"]):
-                        query_keywords.append("health")
-                    if any(word in recent_insight.lower() for word in ["finance", "money", "financial", "wealth"]):
-                        query_keywords.append("finance")
+                    query_keywords = _extract_themes(recent_insight)
                     
                     if query_keywords:
                         query = f"{zodiac} {' '.join(query_keywords)} daily horoscope insight"
@@ -134,27 +111,101 @@ async def generate_insight(
         # Fallback to simple template
         insight = f"{name}, your {zodiac} energy is strong today. Trust your intuition and embrace the opportunities that come your way."
     
-    # Translate if needed
-    if language != "en":
-        insight = translation_service.translate(insight, language)
+    # Cache the untranslated insight; the hit path translates on the way out
+    await cache_service.set_daily_insight(zodiac, insight, target_date, audience=audience)
+    return insight
+
+
+async def generate_insight(
+    name: str,
+    zodiac: str,
+    language: str = "en",
+    user_id: Optional[str] = None,
+    target_date: Optional[date] = None,
+    birth_details: Optional[any] = None
+) -> tuple[str, bool, Optional[float]]:
+    """
+    Generate personalized astrological insight (async)
+    
+    This function orchestrates:
+    1. Cache lookup
+    2. User profile retrieval
+    3. Vector store retrieval for context
+    4. LLM generation
+    5. Cache storage (untranslated)
+    6. Translation (if needed)
     
-    # Cache the insight
-    await cache_service.set_daily_insight(zodiac, insight, target_date)
+    Args:
+        name: User's name
+        zodiac: Zodiac sign
+        language: Target language code (default: "en")
+        user_id: Optional user ID for personalization
+        target_date: Optional target date (defaults to today)
+        birth_details: Optional birth details object (BirthDetails model)
+        
+    Returns:
+        Tuple of (insight_text, cache_hit, user_score); user_score is None
+        when no user_id is given
+    """
+    if target_date is None:
+        target_date = today()
+    is_en = language == "en"
+    # Insights are written for one reader: keyed by user when their profile
+    # history shapes the text, otherwise by the name it is addressed to
+    user_profile = await cache_service.get_user_profile(user_id) if user_id else None
+    audience = ("user", user_id) if user_profile else ("name", name)
+    
+    # Arguments for recording the user interaction, shared by both paths
+    record_kwargs = {"user_id": user_id, "zodiac": zodiac}
+    if user_id and birth_details:
+        record_kwargs.update(
+            name=birth_details.name,
+            birth_date=birth_details.birth_date,
+            birth_time=birth_details.birth_time,
+            birth_place=birth_details.birth_place,
+            latitude=birth_details.latitude,
+            longitude=birth_details.longitude
+        )
+    
+    # Check cache first
+    cached_insight = await cache_service.get_daily_insight(zodiac, target_date, audience=audience)
+    user_score = None
+    if cached_insight:
+        logger.info(f"Cache hit for {zodiac} on {target_date}")
+        
+        # Translate if needed
+        if not is_en:
+            cached_insight = await _translate(cached_insight, language)
+        
+        # Record user interaction
+        if user_id:
+            await cache_service.record_user_insight(**record_kwargs, insight=cached_insight)
+            user_score = await cache_service.update_user_score(user_id, 0.5)  # Lower score for cached insights
+        
+        return cached_insight, True, user_score
+    
+    # Cache miss - generate new insight. Concurrent misses for the same
+    # sign, reader and day share a single generation
+    insight = await cache_service.single_flight(
+        (zodiac, audience, target_date.toordinal()),
+        lambda: _generate_daily_insight(name, zodiac, user_profile, target_date, audience)
+    )
+    
+    # A user without a profile got text addressed only by name; it becomes
+    # theirs once the profile is created below, so repeat requests still hit.
+    # /predict makes up a throwaway id for anonymous requests, and only an id
+    # the caller supplied will ever come back to read this copy
+    caller_user_id = birth_details.user_id if birth_details is not None else user_id
+    if caller_user_id and not user_profile:
+        await cache_service.set_daily_insight(zodiac, insight, target_date, audience=("user", caller_user_id))
+    
+    # Translate if needed
+    if not is_en:
+        insight = await _translate(insight, language)
     
     # Record user interaction for personalization
     if user_id:
-        # Pass birth details if available
-        kwargs = {"user_id": user_id, "zodiac": zodiac, "insight": insight}
-        if birth_details:
-            kwargs.update({
-                "name": birth_details.name,
-                "birth_date": birth_details.birth_date,
-                "birth_time": birth_details.birth_time,
-                "birth_place": birth_details.birth_place,
-                "latitude": birth_details.latitude,
-                "longitude": birth_details.longitude
-            })
-        await cache_service.record_user_insight(**kwargs)
-        await cache_service.update_user_score(user_id, 1.0)
+        await cache_service.record_user_insight(**record_kwargs, insight=insight)
+        user_score = await cache_service.update_user_score(user_id, 1.0)
     
-    return insight, False
+    return insight, False, user_score
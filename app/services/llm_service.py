@@ -1,72 +1,80 @@
 import logging
+import random
 from typing import Optional, List
-import cohere
 from app.config import settings
+from app.services.cohere_client import get_client
 
 logger = logging.getLogger(__name__)
 
 # Fallback templates if LLM fails
 FALLBACK_TEMPLATES = {
-    "Aries": [
+    "Aries": (
         "Your fiery Aries energy is strong today. Take bold action on your goals.",
         "As an Aries, you're feeling particularly driven. Channel this energy into productive pursuits.",
-    ],
-    "Taurus": [
+    ),
+    "Taurus": (
         "Your grounded Taurus nature will help you stay steady through any challenges today.",
         "As a Taurus, focus on stability and comfort. Trust your practical instincts.",
-    ],
-    "Gemini": [
+    ),
+    "Gemini": (
         "Your curious Gemini mind is buzzing with ideas today. Share your thoughts with others.",
         "As a Gemini, communication is key. Express yourself clearly and listen actively.",
-    ],
-    "Cancer": [
+    ),
+    "Cancer": (
         "Your intuitive Cancer nature is heightened today. Trust your emotional intelligence.",
         "As a Cancer, focus on nurturing relationships and creating a safe space for yourself.",
-    ],
-    "Leo": [
+    ),
+    "Leo": (
         "Your innate leadership and warmth will shine today. Embrace spontaneity and avoid overthinking.",
         "As a Leo, your natural charisma is at its peak. Share your light with others.",
-    ],
-    "Virgo": [
+    ),
+    "Virgo": (
         "Your analytical Virgo mind will help you solve complex problems today.",
         "As a Virgo, attention to detail is your strength. Use it to improve your daily routines.",
-    ],
-    "Libra": [
+    ),
+    "Libra": (
         "Your diplomatic Libra nature will help you find balance in relationships today.",
         "As a Libra, seek harmony and beauty. Make time for things that bring you joy.",
-    ],
-    "Scorpio": [
+    ),
+    "Scorpio": (
         "Your intense Scorpio energy is focused today. Dive deep into what matters most.",
         "As a Scorpio, your transformative power is strong. Embrace change and growth.",
-    ],
-    "Sagittarius": [
+    ),
+    "Sagittarius": (
         "Your adventurous Sagittarius spirit is calling. Explore new ideas and perspectives.",
         "As a Sagittarius, your optimism will carry you through. Keep your eyes on the horizon.",
-    ],
-    "Capricorn": [
+    ),
+    "Capricorn": (
         "Your disciplined Capricorn nature will help you achieve your goals today.",
         "As a Capricorn, focus on long-term planning. Your hard work is paying off.",
-    ],
-    "Aquarius": [
+    ),
+    "Aquarius": (
         "Your innovative Aquarius mind is full of unique ideas today. Share your vision.",
         "As an Aquarius, your humanitarian spirit is strong. Connect with your community.",
-    ],
-    "Pisces": [
+    ),
+    "Pisces": (
         "Your intuitive Pisces nature is guiding you today. Trust your inner voice.",
         "As a Pisces, your creativity and empathy are heightened. Express yourself authentically.",
-    ],
+    ),
 }
 
+# Used for signs without dedicated templates
+_GENERIC_FALLBACK = (
+    "{name}, trust your intuition today. The stars are aligned in your favor.",
+)
+
+PREAMBLE = (
+    "You are an expert astrologer who provides personalized, warm, and insightful daily horoscopes. "
+    "Keep responses concise (1-2 sentences) and encouraging."
+)
+
 class AsyncLLMService:
     """Async service for generating insights using Cohere LLM"""
     
     def __init__(self):
-        self.client = None
-        if settings.COHERE_API_KEY:
-            try:
-                self.client = cohere.AsyncClient(api_key=settings.COHERE_API_KEY)
-            except Exception as e:
-                logger.warning(f"Failed to initialize Cohere client: {e}")
+        self._model = settings.COHERE_MODEL
+        self._temperature = settings.COHERE_TEMPERATURE
+        self._max_tokens = settings.COHERE_MAX_TOKENS
     
     async def generate_insight(
         self,
@@ -89,20 +97,20 @@ class AsyncLLMService:
         Returns:
             Generated insight text
         """
-        if not self.client:
+        client = get_client()
+        if not client:
             logger.warning("Cohere client not initialized, using fallback")
             return self._get_fallback_insight(name, zodiac, user_profile)
         
         try:
             prompt = self._build_prompt(name, zodiac, context, user_profile)
-            preamble = "You are an expert astrologer who provides personalized, warm, and insightful daily horoscopes. Keep responses concise (1-2 sentences) and encouraging."
             
-            response = await self.client.chat(
-                model=settings.COHERE_MODEL,
+            response = await client.chat(
+                model=self._model,
                 message=prompt,
-                preamble=preamble,
-                temperature=settings.COHERE_TEMPERATURE,
-                max_tokens=settings.COHERE_MAX_TOKENS
+                preamble=PREAMBLE,
+                temperature=self._temperature,
+                max_tokens=self._max_tokens
             )
             
             insight = response.text.strip()
@@ -123,7 +131,7 @@ class AsyncLLMService:
         user_profile: Optional[dict] = None
     ) -> str:
         """Build the prompt for LLM with user profile personalization"""
-        prompt = f"Generate a personalized daily astrological insight for {name}, who is a {zodiac}."
+        parts = [f"Generate a personalized daily astrological insight for {name}, who is a {zodiac}."]
         
         # Include user profile information for personalization
         if user_profile:
@@ -132,53 +140,44 @@ class AsyncLLMService:
             preferred_zodiac = user_profile.get("preferred_zodiac")
             
             if insights_count > 0:
-                prompt += f"\n\nThis user has requested {insights_count} insight(s) before."
+                parts.append(f"\nThis user has requested {insights_count} insight(s) before.")
             
             # Use past insights to understand user preferences
             if past_insights:
                 # Extract common themes or categories from past insights
-                prompt += "\n\nConsider their past insights to maintain consistency and build on previous guidance:"
-                # Show last 2-3 insights for context
-                recent_insights = past_insights[-3:]
-                for i, past in enumerate(recent_insights, 1):
-                    prompt += f"\n- Previous insight: {past.get('insight', '')[:100]}..."
+                parts.append("\nConsider their past insights to maintain consistency and build on previous guidance:")
+                # Show last 2-3 insights for context (deques don't support slicing)
+                recent_insights = list(past_insights)[-3:]
+                parts.extend(f"- Previous insight: {past.get('insight', '')[:100]}..." for past in recent_insights)
             
             if preferred_zodiac and preferred_zodiac == zodiac:
-                prompt += "\n\nThis is their preferred zodiac sign, so make the insight particularly meaningful."
+                parts.append("\nThis is their preferred zodiac sign, so make the insight particularly meaningful.")
         
         if context:
-            prompt += "\n\nConsider these related astrological insights:\n"
-            for i, ctx in enumerate(context, 1):
-                prompt += f"{i}. {ctx}\n"
+            parts.append("\nConsider these related astrological insights:")
+            parts.append("\n".join(f"{i}. {ctx}" for i, ctx in enumerate(context, 1)))
+            parts.append("")
         
-        prompt += "\nMake it personal, warm, and specific to their zodiac sign. Keep it to 1-2 sentences."
-        return prompt
+        parts.append("Make it personal, warm, and specific to their zodiac sign. Keep it to 1-2 sentences.")
+        return "\n".join(parts)
     
     def _get_fallback_insight(self, name: str, zodiac: str, user_profile: Optional[dict] = None) -> str:
         """Get fallback insight from templates, with personalization if user profile available"""
-        import random
-        templates = FALLBACK_TEMPLATES.get(zodiac, [
-            f"{name}, trust your intuition today. The stars are aligned in your favor."
-        ])
+        templates = FALLBACK_TEMPLATES.get(zodiac) or _GENERIC_FALLBACK
         
-        # If user profile exists, try to personalize the selection
-        if user_profile and user_profile.get("past_insights"):
-            past_insights = user_profile.get("past_insights", [])
-            # If user has history, use a different template to show variety
-            # This simulates personalization even in fallback mode
-            if len(past_insights) > 2:
-                # Use a different template index for returning users
-                template_index = len(past_insights) % len(templates)
-                template = templates[template_index]
-            else:
-                template = random.choice(templates)
+        insights_count = user_profile.get("insights_count", 0) if user_profile else 0
+        
+        # Returning users rotate through templates by history length to show variety
+        # This simulates personalization even in fallback mode
+        if insights_count > 2:
+            template = templates[insights_count % len(templates)]
         else:
             template = random.choice(templates)
         
         result = template.replace("{name}", name) if "{name}" in template else f"{name}, {template}"
         
         # Add personalization note if user has history
-        if user_profile and user_profile.get("insights_count", 0) > 1:
+        if insights_count > 1:
             result += " Based on your journey, continue trusting your path."
         
         return result
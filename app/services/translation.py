@@ -1,23 +1,36 @@
+import asyncio
+import hashlib
 import logging
+import time
+from collections import OrderedDict
+from typing import List, Tuple
 import cohere
 from app.config import settings
+from app.services.cache import cache_service
+from app.services.cohere_client import get_client
 
 logger = logging.getLogger(__name__)
 
+# Map language codes to full names
+LANGUAGE_NAMES = {
+    "hi": "Hindi",
+    "ta": "Tamil",
+    "te": "Telugu",
+}
+SUPPORTED_LANGUAGES = frozenset({"en", *LANGUAGE_NAMES})
+
+_PROMPT_TEMPLATE = "Translate the following English text to {language}. Only provide the translation, nothing else:\n\n{text}"
+
 class TranslationService:
-    """Service for translating insights to Hindi and other languages using Cohere"""
+    """Async service for translating insights to Hindi and other languages using Cohere"""
     
     def __init__(self):
-        self.client = None
-        if settings.COHERE_API_KEY:
-            try:
-                self.client = cohere.Client(api_key=settings.COHERE_API_KEY)
-            except Exception as e:
-                logger.warning(f"Failed to initialize Cohere client: {e}")
+        # (target language, sha1 of text) -> (expires_at on the time.monotonic() clock, translation), oldest first
+        self._cache: "OrderedDict[Tuple[str, bytes], Tuple[float, str]]" = OrderedDict()
     
-    def translate(self, text: str, target_lang: str = "hi", source_lang: str = "en") -> str:
+    async def translate(self, text: str, target_lang: str = "hi", source_lang: str = "en") -> str:
         """
-        Translate text to target language using Cohere
+        Translate text to target language using Cohere (async)
         
         Args:
             text: Text to translate
@@ -30,41 +43,77 @@ class TranslationService:
         if target_lang == source_lang or target_lang == "en":
             return text
         
-        if not self.client:
+        client = get_client()
+        if not client:
             logger.warning("Cohere client not initialized, returning original text")
             return text
         
+        key = (target_lang, hashlib.sha1(text.encode()).digest())
+        entry = self._cache.get(key)
+        if entry is not None:
+            expires_at, translated = entry
+            if expires_at > time.monotonic():
+                self._cache.move_to_end(key)
+                return translated
+            del self._cache[key]
+        
         try:
-            # Map language codes to full names
-            lang_map = {
-                "hi": "Hindi",
-                "ta": "Tamil",
-                "te": "Telugu",
-            }
-            
-            target_language = lang_map.get(target_lang, target_lang)
-            
-            prompt = f"Translate the following English text to {target_language}. Only provide the translation, nothing else:\n\n{text}"
-            
-            response = self.client.chat(
-                model=settings.COHERE_MODEL,
-                message=prompt,
-                temperature=0.3,  # Lower temperature for more accurate translation
-                max_tokens=300
+            # Concurrent requests for the same text share one Cohere call
+            return await cache_service.single_flight(
+                ("translation", *key), lambda: self._request_translation(client, key, text, target_lang)
             )
-            
-            translated = response.text.strip()
-            logger.info(f"Translated text to {target_language}")
-            return translated
-            
         except Exception as e:
             logger.error(f"Error translating text: {e}")
             return text
     
+    async def _request_translation(
+        self, client: cohere.AsyncClient, key: Tuple[str, bytes], text: str, target_lang: str
+    ) -> str:
+        """Translate text with Cohere and remember the result under key"""
+        target_language = LANGUAGE_NAMES.get(target_lang, target_lang)
+        prompt = _PROMPT_TEMPLATE.format(language=target_language, text=text)
+        
+        response = await client.chat(
+            model=settings.COHERE_MODEL,
+            message=prompt,
+            temperature=0.3,  # Lower temperature for more accurate translation
+            max_tokens=300
+        )
+        
+        translated = response.text.strip()
+        logger.info(f"Translated text to {target_language}")
+        
+        self._cache[key] = (time.monotonic() + settings.TRANSLATION_CACHE_TTL_SECONDS, translated)
+        if len(self._cache) > settings.TRANSLATION_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return translated
+    
+    async def translate_many(self, texts: List[str], target_lang: str = "hi", source_lang: str = "en") -> List[str]:
+        """
+        Translate several texts concurrently
+        
+        Args:
+            texts: Texts to translate
+            target_lang: Target language code (e.g., 'hi' for Hindi)
+            source_lang: Source language code (default: 'en')
+            
+        Returns:
+            Translated texts in input order (originals for any that fail)
+        """
+        if target_lang == source_lang or target_lang == "en":
+            return list(texts)
+        
+        semaphore = asyncio.Semaphore(settings.TRANSLATION_CONCURRENCY)
+        
+        async def translate_one(text: str) -> str:
+            async with semaphore:
+                return await self.translate(text, target_lang, source_lang)
+        
+        return list(await asyncio.gather(*(translate_one(text) for text in texts)))
+    
     def is_language_supported(self, lang_code: str) -> bool:
         """Check if a language is supported"""
-        supported_languages = ["en", "hi", "ta", "te"]
-        return lang_code in supported_languages
+        return lang_code in SUPPORTED_LANGUAGES
 
 # Singleton instance
 translation_service = TranslationService()
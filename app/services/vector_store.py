@@ -1,26 +1,67 @@
-import json
+import asyncio
+import hashlib
 import logging
+import math
+import mmap
 import os
-from typing import List, Dict
+import random
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+import cohere
 import numpy as np
+import orjson
 import faiss
-import cohere
 from app.config import settings
+from app.services.cohere_client import get_client
 
 logger = logging.getLogger(__name__)
 
+# Bump when the index type or layout changes so persisted indexes are rebuilt
+INDEX_FORMAT_VERSION = 3
+
 class AsyncVectorStore:
     """Async vector store using Cohere embeddings and FAISS for similarity search"""
     
     def __init__(self):
-        self.client = None
-        self.corpus = []
+        # Corpus stored column-wise: position i is texts[i] with int-coded zodiac/category
+        self.texts: List[str] = []
+        self.zodiacs = np.empty(0, dtype=np.int32)
+        self.categories = np.empty(0, dtype=np.int32)
+        self._zodiac_names: List[str] = []
+        self._category_names: List[str] = []
+        # Lowercased zodiac sign -> code into _zodiac_names
+        self._zodiac_to_code: Dict[str, int] = {}
+        # Zodiac code -> corpus positions of that sign's insights
+        self._positions_by_zodiac: List[np.ndarray] = []
         self.index = None
+        # Per-sign sub-indices; row i of a sub-index is corpus item ids_by_zodiac[sign][i]
+        self.indices_by_zodiac: Dict[str, faiss.Index] = {}
+        self.ids_by_zodiac: Dict[str, np.ndarray] = {}
         self.dimension = 1024  # Cohere embed-english-v3.0 embedding dimension
+        # Vectors are unit-normalized, so inner product is cosine similarity without a sqrt
+        self.metric = faiss.METRIC_INNER_PRODUCT
+        # (embedding model, query) -> row of _query_buf holding its normalized embedding, LRU order
+        self._query_cache: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        # Preallocated once; evicted rows are overwritten so queries never allocate
+        self._query_buf = np.empty((max(1, settings.QUERY_EMBED_CACHE_SIZE), self.dimension), dtype=np.float32)
         self._initialized = False
+        # Set when embedding the corpus fails, so later searches do not retry it
+        self._embeddings_failed = False
+        self._corpus_hash = None
         
-        if settings.VECTOR_STORE_ENABLED and settings.COHERE_API_KEY:
-            self.client = cohere.AsyncClient(api_key=settings.COHERE_API_KEY)
+        # Pin FAISS's OpenMP pool so it does not oversubscribe cores shared with the event loop
+        faiss.omp_set_num_threads(settings.FAISS_NUM_THREADS)
+    
+    def _get_client(self) -> Optional[cohere.AsyncClient]:
+        """
+        Get the shared Cohere client for embeddings
+        
+        Returns:
+            Shared Cohere client, or None if embeddings are disabled or unavailable
+        """
+        if not settings.VECTOR_STORE_ENABLED or self._embeddings_failed:
+            return None
+        return get_client()
     
     async def initialize(self):
         """Initialize the vector store with corpus and embeddings"""
@@ -35,22 +76,30 @@ class AsyncVectorStore:
             corpus_path = os.path.join(project_root, "app", "data", "astrological_corpus.json")
             
             if os.path.exists(corpus_path):
-                with open(corpus_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.corpus = data.get("insights", [])
+                # Parse and hash straight from the page cache instead of copying the file
+                with open(corpus_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    with memoryview(mm) as corpus_view:
+                        self._load_corpus(orjson.loads(corpus_view).get("insights", []))
+                        # Persisted indexes are only valid for the same corpus, model and index layout
+                        fingerprint = f"{settings.COHERE_EMBEDDING_MODEL}:{settings.VECTOR_INDEX_IVF_MIN_SIZE}:{INDEX_FORMAT_VERSION}"
+                        corpus_hash = hashlib.sha256(corpus_view)
+                corpus_hash.update(fingerprint.encode())
+                self._corpus_hash = corpus_hash.hexdigest()[:16]
             else:
                 logger.warning(f"Corpus file not found at {corpus_path}, using empty corpus")
-                self.corpus = []
+                self._load_corpus([])
             
-            # Initialize FAISS index and build embeddings
-            if self.corpus and self.client:
+            # Initialize FAISS index, reusing a persisted one when the corpus is unchanged
+            if self.texts and self._get_client():
                 try:
-                    await self._build_embeddings()
+                    if not self._load_index(project_root):
+                        await self._build_embeddings()
+                        self._save_index(project_root)
                     self._initialized = True
-                    logger.info(f"Vector store initialized with {len(self.corpus)} insights using Cohere embeddings")
+                    logger.info(f"Vector store initialized with {len(self.texts)} insights using Cohere embeddings")
                 except Exception as e:
                     logger.error(f"Failed to initialize embeddings: {e}")
-                    self.client = None
+                    self._embeddings_failed = True
             else:
                 logger.warning("No corpus data or Cohere client unavailable, vector store disabled")
                 
@@ -58,33 +107,260 @@ class AsyncVectorStore:
             logger.error(f"Error initializing vector store: {e}")
             self._initialized = False
     
+    def _load_corpus(self, insights: List[Dict[str, str]]):
+        """
+        Store corpus insights as a text list plus int-coded zodiac and category arrays
+        
+        Only these fields are kept; the parsed item dicts can be freed afterwards.
+        
+        Args:
+            insights: Corpus items with "text" and optional "zodiac"/"category" keys
+        """
+        zodiac_codes: Dict[str, int] = {}
+        category_codes: Dict[str, int] = {}
+        self.texts = [item["text"] for item in insights]
+        self.zodiacs = np.fromiter(
+            (zodiac_codes.setdefault(item.get("zodiac", "Unknown"), len(zodiac_codes)) for item in insights),
+            dtype=np.int32, count=len(insights)
+        )
+        self.categories = np.fromiter(
+            (category_codes.setdefault(item.get("category", "general"), len(category_codes)) for item in insights),
+            dtype=np.int32, count=len(insights)
+        )
+        self._zodiac_names = list(zodiac_codes)
+        self._category_names = list(category_codes)
+        self._zodiac_to_code = {zodiac.lower(): code for zodiac, code in zodiac_codes.items()}
+        # Group positions by sign once, with one stable sort instead of a scan per sign
+        order = np.argsort(self.zodiacs, kind="stable")
+        counts = np.bincount(self.zodiacs, minlength=len(self._zodiac_names))
+        self._positions_by_zodiac = np.split(order, np.cumsum(counts)[:-1])
+    
     async def _build_embeddings(self):
         """Build embeddings for all corpus texts using Cohere"""
-        if not self.client or not self.corpus:
+        if not self._get_client() or not self.texts:
             return
         
         try:
-            texts = [item["text"] for item in self.corpus]
-            
             # Get embeddings from Cohere (batch processing)
-            logger.info(f"Generating embeddings for {len(texts)} texts...")
-            response = await self.client.embed(
-                model=settings.COHERE_EMBEDDING_MODEL,
-                texts=texts,
-                input_type="search_document"
-            )
+            logger.info(f"Generating embeddings for {len(self.texts)} texts...")
+            embeddings_array = await self._embed_batches(self.texts, "search_document")
+            
+            # Unit-normalize so inner product is cosine similarity
+            faiss.normalize_L2(embeddings_array)
             
-            # Extract embeddings
-            embeddings_array = np.array(response.embeddings, dtype='float32')
+            # Training and adding can take minutes on large corpora, and search()
+            # may trigger this build, so keep it off the event loop
+            self.index = await asyncio.to_thread(self._build_index, embeddings_array)
             
-            # Create FAISS index
-            self.index = faiss.IndexFlatL2(self.dimension)
-            self.index.add(embeddings_array)
+            # One small index per sign so zodiac-filtered queries search only that sign
+            self.ids_by_zodiac = self._group_ids_by_zodiac()
+            for zodiac, ids in self.ids_by_zodiac.items():
+                self.indices_by_zodiac[zodiac] = await asyncio.to_thread(self._build_index, embeddings_array[ids])
             
-            logger.info(f"Built FAISS index with {self.index.ntotal} vectors")
+            logger.info(f"Built FAISS index with {self.index.ntotal} vectors across {len(self.indices_by_zodiac)} zodiac sub-indices")
         except Exception as e:
             logger.error(f"Error building embeddings: {e}")
             self.index = None
+            self.indices_by_zodiac = {}
+            self.ids_by_zodiac = {}
+    
+    def _group_ids_by_zodiac(self) -> Dict[str, np.ndarray]:
+        """Map each zodiac sign to the corpus positions of its insights"""
+        return dict(zip(self._zodiac_names, self._positions_by_zodiac))
+    
+    def _index_paths(self, project_root: str) -> Dict[str, str]:
+        """
+        Get the on-disk locations of the combined and per-sign indexes
+        
+        Returns:
+            Mapping of zodiac sign (None for the combined index) to file path,
+            or an empty dict when persistence is disabled
+        """
+        if not settings.VECTOR_STORE_CACHE_PATH or not self._corpus_hash:
+            return {}
+        cache_dir = os.path.join(project_root, settings.VECTOR_STORE_CACHE_PATH)
+        prefix = os.path.join(cache_dir, f"faiss_{self._corpus_hash}")
+        paths = {None: f"{prefix}.index"}
+        for zodiac in self._group_ids_by_zodiac():
+            paths[zodiac] = f"{prefix}_{zodiac}.index"
+        return paths
+    
+    def _load_index(self, project_root: str) -> bool:
+        """
+        Load persisted indexes for the current corpus, if all of them exist
+        
+        Returns:
+            True if the indexes were loaded, False if they need to be built
+        """
+        paths = self._index_paths(project_root)
+        if not paths or not all(os.path.exists(path) for path in paths.values()):
+            return False
+        
+        try:
+            self.index = self._read_index(paths.pop(None))
+            self.ids_by_zodiac = self._group_ids_by_zodiac()
+            self.indices_by_zodiac = {zodiac: self._read_index(path) for zodiac, path in paths.items()}
+        except Exception as e:
+            logger.warning(f"Failed to load persisted FAISS index, rebuilding: {e}")
+            self.index = None
+            self.indices_by_zodiac = {}
+            self.ids_by_zodiac = {}
+            return False
+        
+        logger.info(f"Loaded persisted FAISS index with {self.index.ntotal} vectors")
+        return True
+    
+    def _save_index(self, project_root: str):
+        """Persist the built indexes so the next start can skip re-embedding"""
+        paths = self._index_paths(project_root)
+        if not paths or self.index is None:
+            return
+        
+        try:
+            os.makedirs(os.path.dirname(paths[None]), exist_ok=True)
+            indexes = {None: self.index, **self.indices_by_zodiac}
+            for zodiac, path in paths.items():
+                # Write then rename so a crash never leaves a truncated index behind
+                tmp_path = f"{path}.tmp"
+                faiss.write_index(indexes[zodiac], tmp_path)
+                os.replace(tmp_path, path)
+            logger.info(f"Persisted FAISS index to {paths[None]}")
+        except Exception as e:
+            logger.warning(f"Failed to persist FAISS index: {e}")
+    
+    async def _embed_batches(self, texts: List[str], input_type: str) -> np.ndarray:
+        """
+        Embed texts in Cohere-sized batches, running batches concurrently
+        
+        Args:
+            texts: Texts to embed
+            input_type: Cohere input type ("search_document" or "search_query")
+            
+        Returns:
+            (len(texts), dimension) float32 array, in input order
+        """
+        client = self._get_client()
+        batch_size = settings.COHERE_EMBED_BATCH_SIZE
+        semaphore = asyncio.Semaphore(settings.COHERE_EMBED_CONCURRENCY)
+        
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                response = await client.embed(
+                    model=settings.COHERE_EMBEDDING_MODEL,
+                    texts=batch,
+                    input_type=input_type,
+                    truncate="END"  # Clip over-long texts instead of failing the batch
+                )
+            return response.embeddings
+        
+        batches = await asyncio.gather(*(
+            embed_batch(texts[start:start + batch_size])
+            for start in range(0, len(texts), batch_size)
+        ))
+        return np.array([embedding for batch in batches for embedding in batch], dtype='float32')
+    
+    async def _embed_query(self, query: str) -> np.ndarray:
+        """
+        Get the normalized embedding for a search query, using the LRU cache
+        
+        The result is a view into the shared query buffer whose row may be
+        reused once the entry is evicted, so use it before the next await.
+        
+        Args:
+            query: Search query text
+            
+        Returns:
+            (1, dimension) float32 unit-normalized embedding
+        """
+        cache_key = (settings.COHERE_EMBEDDING_MODEL, query)
+        row = self._query_cache.get(cache_key)
+        if row is None:
+            # Get query embedding from Cohere
+            response = await self._get_client().embed(
+                model=settings.COHERE_EMBEDDING_MODEL,
+                texts=[query],
+                input_type="search_query",
+                truncate="END"
+            )
+            
+            # A concurrent miss for the same query may have filled a row meanwhile
+            row = self._query_cache.get(cache_key)
+            if row is None:
+                if len(self._query_cache) < len(self._query_buf):
+                    row = len(self._query_cache)
+                else:
+                    _, row = self._query_cache.popitem(last=False)
+                self._query_buf[row] = response.embeddings[0]
+                faiss.normalize_L2(self._query_buf[row:row + 1])
+                self._query_cache[cache_key] = row
+        
+        self._query_cache.move_to_end(cache_key)
+        return self._query_buf[row:row + 1]
+    
+    def _build_index(self, embeddings_array: np.ndarray) -> faiss.Index:
+        """Create and train an index for embeddings_array, then add them to it (blocking)"""
+        index = self._create_index(embeddings_array)
+        index.add(embeddings_array)
+        return index
+    
+    def _create_index(self, embeddings_array: np.ndarray) -> faiss.Index:
+        """
+        Create (and train, if needed) a FAISS index sized for the corpus
+        
+        Small corpora use an exhaustive index storing fp16 vectors. From
+        VECTOR_INDEX_IVF_MIN_SIZE vectors up, an OPQ + IVF-PQ index compresses
+        each vector to 64 bytes and only scans VECTOR_INDEX_NPROBE cells per query.
+        
+        Args:
+            embeddings_array: (N, dimension) float32 unit-normalized corpus embeddings
+            
+        Returns:
+            Empty index ready for add()
+        """
+        n_vectors = embeddings_array.shape[0]
+        if n_vectors < settings.VECTOR_INDEX_IVF_MIN_SIZE:
+            # Exhaustive scan over fp16 codes: half the bytes read per query vs float32
+            index = faiss.IndexScalarQuantizer(
+                self.dimension, faiss.ScalarQuantizer.QT_fp16, self.metric
+            )
+            index.train(embeddings_array)
+            return index
+        
+        index = self._new_ivf_pq_index(n_vectors)
+        index.train(embeddings_array)
+        logger.info(f"Trained IVF-PQ index with {faiss.extract_index_ivf(index).nlist} lists for {n_vectors} vectors")
+        return index
+    
+    def _read_index(self, path: str) -> faiss.Index:
+        """Read a persisted index, applying the current VECTOR_INDEX_NPROBE to IVF indexes"""
+        index = faiss.read_index(path)
+        # nprobe is serialized with the index, so a saved one keeps its build-time value
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = settings.VECTOR_INDEX_NPROBE
+        return index
+    
+    def _new_ivf_pq_index(self, n_vectors: int) -> faiss.Index:
+        """
+        Create an untrained OPQ + IVF-PQ index for a corpus of n_vectors
+        
+        OPQ rotates and reduces vectors to 256 dims, which PQ64 encodes in 64
+        bytes. The coarse quantizer is an HNSW graph over the IVF centroids, so
+        picking the cells to probe does not scan every centroid.
+        
+        Args:
+            n_vectors: Number of corpus vectors the index will hold
+            
+        Returns:
+            Untrained index with nprobe set from VECTOR_INDEX_NPROBE
+        """
+        # FAISS wants 39 training points per list; below that, centroids are under-trained
+        nlist = max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+        index = faiss.index_factory(
+            self.dimension, f"OPQ64_256,IVF{nlist}_HNSW32,PQ64", self.metric
+        )
+        faiss.extract_index_ivf(index).nprobe = settings.VECTOR_INDEX_NPROBE
+        return index
     
     async def search(self, query: str, zodiac: str = None, top_k: int = None) -> List[Dict[str, any]]:
         """
@@ -101,51 +377,50 @@ class AsyncVectorStore:
         if not self._initialized:
             await self.initialize()
         
-        if not self._initialized or self.index is None or not self.client:
+        if not self._initialized or self.index is None or not self._get_client():
             logger.debug("Vector store not initialized, returning empty results")
             return []
         
         if top_k is None:
             top_k = settings.TOP_K_RESULTS
         
+        # Route zodiac-qualified queries to that sign's sub-index
+        if zodiac:
+            index = self.indices_by_zodiac.get(zodiac)
+            if index is None:
+                return []
+            ids = self.ids_by_zodiac[zodiac]
+        else:
+            index = self.index
+            ids = None
+        
         try:
-            # Get query embedding from Cohere
-            response = await self.client.embed(
-                model=settings.COHERE_EMBEDDING_MODEL,
-                texts=[query],
-                input_type="search_query"
-            )
-            query_embedding = np.array([response.embeddings[0]], dtype='float32')
+            query_embedding = await self._embed_query(query)
             
             # Search FAISS index
-            # Get more results than needed to filter by zodiac
-            search_k = top_k * 3 if zodiac else top_k
-            distances, indices = self.index.search(query_embedding, min(search_k, self.index.ntotal))
-            
-            # Build results
-            results = []
-            for dist, idx in zip(distances[0], indices[0]):
-                if idx < 0 or idx >= len(self.corpus):
-                    continue
-                
-                item = self.corpus[idx]
-                
-                # Filter by zodiac if specified
-                if zodiac and item.get("zodiac") != zodiac:
-                    continue
-                
-                # Convert L2 distance to similarity score (inverse)
-                similarity_score = 1 / (1 + float(dist))
-                
-                results.append({
-                    "text": item["text"],
-                    "zodiac": item.get("zodiac", "Unknown"),
-                    "score": similarity_score,
-                    "category": item.get("category", "general")
-                })
-                
-                if len(results) >= top_k:
-                    break
+            scores, indices = index.search(query_embedding, min(top_k, index.ntotal))
+            
+            # Drop empty slots and map sub-index rows back to corpus positions
+            found = indices[0] >= 0
+            positions = indices[0][found]
+            if ids is not None:
+                positions = ids[positions]
+            
+            # Inner product of unit vectors is already the cosine similarity
+            results = [
+                {
+                    "text": self.texts[position],
+                    "zodiac": self._zodiac_names[zodiac_code],
+                    "score": score,
+                    "category": self._category_names[category_code]
+                }
+                for position, zodiac_code, category_code, score in zip(
+                    positions.tolist(),
+                    self.zodiacs[positions].tolist(),
+                    self.categories[positions].tolist(),
+                    scores[0][found].tolist()
+                )
+            ]
             
             logger.debug(f"Found {len(results)} similar insights for query: {query[:50]}")
             return results
@@ -165,16 +440,11 @@ class AsyncVectorStore:
         Returns:
             List of insight texts
         """
-        if not self.corpus:
+        code = self._zodiac_to_code.get(zodiac.lower())
+        if code is None:
             return []
-        
-        zodiac_insights = [
-            item["text"] for item in self.corpus
-            if item.get("zodiac", "").lower() == zodiac.lower()
-        ]
-        
-        import random
-        return random.sample(zodiac_insights, min(limit, len(zodiac_insights)))
+        positions = self._positions_by_zodiac[code]
+        return [self.texts[positions[i]] for i in random.sample(range(len(positions)), min(limit, len(positions)))]
 
 # Singleton instance
 vector_store = AsyncVectorStore()
@@ -1,6 +1,7 @@
-from datetime import date
-from typing import Optional
+from datetime import date, timedelta
+from typing import Optional, Tuple
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +21,44 @@ ZODIAC_RANGES = [
     ("Sagittarius", (11, 22), (12, 21)),
 ]
 
+def _build_month_cutoffs() -> Tuple[Optional[Tuple[int, str, str]], ...]:
+    """Derive (last day of outgoing sign, outgoing sign, incoming sign) per month from ZODIAC_RANGES"""
+    cutoffs: list = [None] * 13
+    for name, _, (end_month, end_day) in ZODIAC_RANGES:
+        next_name = next(n for n, (m, d), _ in ZODIAC_RANGES if (m, d) == (end_month, end_day + 1))
+        cutoffs[end_month] = (end_day, name, next_name)
+    return tuple(cutoffs)
+
+# Every month holds exactly one sign boundary, so a month resolves with one comparison
+_MONTH_CUTOFFS = _build_month_cutoffs()
+
+
+def _zodiac_from_month_day(m: int, d: int) -> str:
+    """Resolve a zodiac sign from month and day (used to build the lookup table)"""
+    end_day, outgoing, incoming = _MONTH_CUTOFFS[m]
+    return outgoing if d <= end_day else incoming
+
+
+def _build_month_day_table() -> Tuple[Optional[str], ...]:
+    """Build ZODIAC_BY_MD over a leap year so Feb 29 is covered"""
+    table: list = [None] * (13 * 32)
+    for n in range(366):
+        day = date(2020, 1, 1) + timedelta(days=n)
+        table[day.month * 32 + day.day] = _zodiac_from_month_day(day.month, day.day)
+    return tuple(table)
+
+# ZODIAC_BY_MD[month * 32 + day] -> sign; slots for impossible dates hold None
+ZODIAC_BY_MD = _build_month_day_table()
+
+# NumPy form of ZODIAC_BY_MD for batch lookups: sign indices into _SIGNS (0 for impossible dates)
+_SIGN_NAMES = [name for name, _, _ in ZODIAC_RANGES]
+_SIGNS = np.array(_SIGN_NAMES)
+_SIGN_INDEX_BY_MD = np.array(
+    [0 if sign is None else _SIGN_NAMES.index(sign) for sign in ZODIAC_BY_MD], dtype=np.uint8
+)
+_UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
 def get_zodiac_sign(birth_date: date) -> str:
     """
     Get zodiac sign from birth date using tropical zodiac
@@ -30,19 +69,24 @@ def get_zodiac_sign(birth_date: date) -> str:
     Returns:
         Zodiac sign name
     """
-    m, d = birth_date.month, birth_date.day
-    
-    for name, (m1, d1), (m2, d2) in ZODIAC_RANGES:
-        # if range doesn't cross year (most):
-        if m1 < m2:
-            if (m == m1 and d >= d1) or (m == m2 and d <= d2) or (m1 < m < m2):
-                return name
-        else:
-            # crosses year boundary (Capricorn)
-            if (m == m1 and d >= d1) or (m == m2 and d <= d2) or (m > m1 or m < m2):
-                return name
+    return ZODIAC_BY_MD[birth_date.month * 32 + birth_date.day]
+
+
+def get_zodiac_sign_batch(ordinals: np.ndarray) -> np.ndarray:
+    """
+    Get zodiac signs for many dates at once
     
-    return "Capricorn"
+    Args:
+        ordinals: Dates as proleptic Gregorian ordinals (date.toordinal())
+        
+    Returns:
+        Array of zodiac sign names with the same shape as ordinals
+    """
+    days = (np.asarray(ordinals, dtype=np.int64) - _UNIX_EPOCH_ORDINAL).astype("datetime64[D]")
+    month_starts = days.astype("datetime64[M]")
+    months = month_starts.astype(np.int64) % 12 + 1
+    days_of_month = (days - month_starts).astype(np.int64) + 1
+    return _SIGNS[_SIGN_INDEX_BY_MD[months * 32 + days_of_month]]
 
 
 def get_ascendant(birth_date: date, birth_time: str, latitude: float, longitude: float) -> Optional[str]:
@@ -0,0 +1,10 @@
+import asyncio
+import pytest
+
+
+@pytest.fixture(scope="session")
+def cache():
+    """Shared cache service for the whole test session, cleared afterwards"""
+    from app.services.cache import cache_service
+    yield cache_service
+    asyncio.run(cache_service.clear_cache())
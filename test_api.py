@@ -1,30 +1,40 @@
 import pytest
+import pytest_asyncio
 import asyncio
 from unittest.mock import patch, AsyncMock
-from fastapi.testclient import TestClient
+from httpx import AsyncClient, ASGITransport
 from app.main import app
 from app.services.cache import cache_service
 
-client = TestClient(app)
+pytestmark = pytest.mark.asyncio
 
-def test_read_main():
+def make_client() -> AsyncClient:
+    """Create an HTTP client that calls the app in-process over ASGI"""
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+@pytest_asyncio.fixture
+async def async_client():
+    async with make_client() as async_client:
+        yield async_client
+
+async def test_read_main(async_client):
     """Test root endpoint"""
-    response = client.get("/")
+    response = await async_client.get("/")
     assert response.status_code == 200
     data = response.json()
     assert "message" in data
     assert "endpoints" in data
     assert data["version"] == "2.0.0"
 
-def test_health_check():
+async def test_health_check(async_client):
     """Test health check endpoint"""
-    response = client.get("/health")
+    response = await async_client.get("/health")
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == "healthy"
     assert "services" in data
 
-def test_predict_insight():
+async def test_predict_insight(async_client):
     """Test basic insight prediction"""
     payload = {
         "name": "Ritika",
@@ -32,7 +42,7 @@ def test_predict_insight():
         "birth_time": "14:30",
         "birth_place": "Jaipur, India"
     }
-    response = client.post("/predict", json=payload)
+    response = await async_client.post("/predict", json=payload)
     assert response.status_code == 200
     data = response.json()
     assert data["zodiac"] == "Leo"
@@ -40,7 +50,7 @@ def test_predict_insight():
     assert data["language"] == "en"
     assert isinstance(data["cache_hit"], bool)
 
-def test_predict_insight_with_user_id():
+async def test_predict_insight_with_user_id(async_client):
     """Test insight prediction with user ID for personalization"""
     payload = {
         "name": "Ritika",
@@ -49,7 +59,7 @@ def test_predict_insight_with_user_id():
         "birth_place": "Jaipur, India",
         "user_id": "test_user_123"
     }
-    response = client.post("/predict", json=payload)
+    response = await async_client.post("/predict", json=payload)
     assert response.status_code == 200
     data = response.json()
     assert data["zodiac"] == "Leo"
@@ -57,7 +67,21 @@ def test_predict_insight_with_user_id():
     # User score should be present if user_id provided
     assert "user_score" in data
 
-def test_predict_insight_with_language():
+async def test_predict_returns_updated_user_score(async_client):
+    """Test that user_score reflects the score after this request"""
+    await async_client.delete("/cache")
+    payload = {
+        "name": "Ritika",
+        "birth_date": "1995-08-20",
+        "birth_time": "14:30",
+        "birth_place": "Jaipur, India",
+        "user_id": "test_score_user"
+    }
+    # A fresh insight scores 1.0, a cached one 0.5
+    assert (await async_client.post("/predict", json=payload)).json()["user_score"] == 1.0
+    assert (await async_client.post("/predict", json=payload)).json()["user_score"] == 1.5
+
+async def test_predict_insight_with_language(async_client):
     """Test insight prediction with Hindi language"""
     payload = {
         "name": "Ritika",
@@ -65,13 +89,13 @@ def test_predict_insight_with_language():
         "birth_time": "14:30",
         "birth_place": "Jaipur, India"
     }
-    response = client.post("/predict?language=hi", json=payload)
+    response = await async_client.post("/predict?language=hi", json=payload)
     assert response.status_code == 200
     data = response.json()
     assert data["language"] == "hi"
     assert "insight" in data
 
-def test_predict_insight_with_coordinates():
+async def test_predict_insight_with_coordinates(async_client):
     """Test insight prediction with latitude/longitude for Panchang"""
     payload = {
         "name": "Ritika",
@@ -81,26 +105,26 @@ def test_predict_insight_with_coordinates():
         "latitude": 26.9124,
         "longitude": 75.7873
     }
-    response = client.post("/predict", json=payload)
+    response = await async_client.post("/predict", json=payload)
     assert response.status_code == 200
     data = response.json()
     assert data["zodiac"] == "Leo"
 
-def test_cache_stats():
+async def test_cache_stats(async_client):
     """Test cache statistics endpoint"""
-    response = client.get("/cache/stats")
+    response = await async_client.get("/cache/stats")
     assert response.status_code == 200
     data = response.json()
     assert "cache_enabled" in data
 
-def test_clear_cache():
+async def test_clear_cache(async_client):
     """Test cache clearing endpoint"""
-    response = client.delete("/cache")
+    response = await async_client.delete("/cache")
     assert response.status_code == 200
     data = response.json()
     assert "message" in data
 
-def test_multiple_zodiac_signs():
+async def test_multiple_zodiac_signs(async_client):
     """Test different zodiac signs"""
     test_cases = [
         ("1990-03-25", "Aries"),
@@ -116,12 +140,11 @@ def test_multiple_zodiac_signs():
             "birth_time": "12:00",
             "birth_place": "Test"
         }
-        response = client.post("/predict", json=payload)
+        response = await async_client.post("/predict", json=payload)
         assert response.status_code == 200
         data = response.json()
         assert data["zodiac"] == expected_zodiac
 
-@pytest.mark.asyncio
 async def test_async_cache_operations():
     """Test async cache operations directly"""
     # This test requires pytest-asyncio
@@ -140,7 +163,222 @@ async def test_async_cache_operations():
     updated_profile = await cache_service.get_user_profile(user_id)
     assert updated_profile["score"] == 7.0
 
-def test_caching_behavior():
+async def test_cache_lru_eviction_and_daily_rollover():
+    """Test profile LRU eviction, the daily insight bound, and that only one day is kept"""
+    from datetime import date, timedelta
+    from app.services.cache import AsyncCacheService
+    
+    cache = AsyncCacheService(maxsize=2)
+    await cache.set_user_profile("a", {"score": 1})
+    await cache.set_user_profile("b", {"score": 2})
+    # Touch "a" so "b" becomes the least recently used entry
+    assert await cache.get_user_profile("a") is not None
+    await cache.set_user_profile("c", {"score": 3})
+    
+    assert await cache.get_user_profile("b") is None
+    assert await cache.get_user_profile("a") is not None
+    assert await cache.get_user_profile("c") is not None
+    
+    # Daily insights share the size bound, counted separately from profiles
+    yesterday = date.today() - timedelta(days=1)
+    await cache.set_daily_insight("Leo", "Old insight", yesterday)
+    await cache.set_daily_insight("Virgo", "Old Virgo insight", yesterday)
+    assert await cache.get_daily_insight("Leo", yesterday) == "Old insight"
+    assert await cache.get_user_profile("c") is not None
+    
+    # Past the bound, the oldest daily insight is dropped first
+    await cache.set_daily_insight("Libra", "Old Libra insight", yesterday)
+    assert len(cache._daily) == 2
+    assert await cache.get_daily_insight("Leo", yesterday) is None
+    assert await cache.get_daily_insight("Virgo", yesterday) == "Old Virgo insight"
+    assert await cache.get_daily_insight("Libra", yesterday) == "Old Libra insight"
+    
+    # Writing a new day drops the previous day's insights
+    await cache.set_daily_insight("Leo", "Fresh insight")
+    assert await cache.get_daily_insight("Leo") == "Fresh insight"
+    assert await cache.get_daily_insight("Leo", yesterday) is None
+    assert await cache.get_daily_insight("Virgo", yesterday) is None
+
+    # A late write for an earlier day is dropped instead of wiping the new day
+    await cache.set_daily_insight("Virgo", "Late old insight", yesterday)
+    assert await cache.get_daily_insight("Leo") == "Fresh insight"
+    assert await cache.get_daily_insight("Virgo", yesterday) is None
+
+async def test_expired_profiles_evicted_without_reads():
+    """Test that expired profiles are dropped via the expiry heap, not only when read"""
+    from app.services.cache import AsyncCacheService
+    from app.config import settings
+    
+    cache = AsyncCacheService()
+    with patch.object(settings, "USER_PROFILE_TTL_SECONDS", 0):
+        await cache.set_user_profile("short_lived_a", {"score": 1})
+        await cache.set_user_profile("short_lived_b", {"score": 2})
+    await cache.set_user_profile("long_lived", {"score": 3})
+    
+    # Writing a fresh profile evicted the expired ones without reading them
+    assert list(cache._profiles) == ["long_lived"]
+    assert len(cache._expiry_heap) == 1
+    assert await cache.get_user_profile("short_lived_a") is None
+    assert (await cache.get_user_profile("long_lived"))["score"] == 3
+
+async def test_profile_activity_restarts_ttl():
+    """Test that in-place profile updates count from last activity, not creation"""
+    from app.services.cache import AsyncCacheService
+    from app.config import settings
+
+    cache = AsyncCacheService()
+    ttl = settings.USER_PROFILE_TTL_SECONDS
+    with patch("app.services.cache.time.monotonic", return_value=1000.0):
+        await cache.update_user_score("active_user", 1.0)
+    with patch("app.services.cache.time.monotonic", return_value=1000.0 + ttl - 1):
+        assert await cache.update_user_score("active_user", 1.0) == 2.0
+        await cache.record_user_insight("active_user", "Leo", "An insight")
+
+    # Past the creation-based expiry, but within the TTL of the last update
+    with patch("app.services.cache.time.monotonic", return_value=1000.0 + ttl + 1):
+        profile = await cache.get_user_profile("active_user")
+    assert profile is not None
+    assert profile["score"] == 2.0
+    assert profile["insights_count"] == 1
+
+async def test_today_is_memoized_per_minute():
+    """Test that the cache reuses one date object within a minute"""
+    from datetime import date
+    from app.services.cache import today, _today_bucket
+    
+    assert today() == date.today()
+    
+    minute_start = 60 * 28_000_000
+    _today_bucket.cache_clear()
+    try:
+        with patch("app.services.cache.date") as mock_date:
+            mock_date.today.side_effect = [date(2024, 1, 1), date(2024, 1, 2)]
+            with patch("app.services.cache.time.time", return_value=minute_start + 5):
+                first = today()
+            with patch("app.services.cache.time.time", return_value=minute_start + 55):
+                assert today() is first
+            # The next minute looks the date up again
+            with patch("app.services.cache.time.time", return_value=minute_start + 65):
+                second = today()
+    finally:
+        _today_bucket.cache_clear()
+    
+    assert first == date(2024, 1, 1)
+    assert second == date(2024, 1, 2)
+    assert mock_date.today.call_count == 2
+
+async def test_cache_buckets_created_lazily():
+    """Test that cache buckets are only allocated on first write"""
+    from app.services.cache import AsyncCacheService
+    
+    cache = AsyncCacheService()
+    assert cache._daily is None
+    assert cache._profiles is None
+    assert await cache.get_daily_insight("Leo") is None
+    assert await cache.get_user_profile("nobody") is None
+    assert (await cache.get_cache_stats())["total_keys"] == 0
+    
+    await cache.set_daily_insight("Leo", "Lazy insight")
+    assert cache._daily is not None
+    assert cache._profiles is None
+    assert await cache.get_daily_insight("Leo") == "Lazy insight"
+    
+    await cache.clear_cache()
+    assert cache._daily is None
+
+async def test_user_past_insights_are_bounded(async_client):
+    """Test that a user profile keeps only the most recent insights"""
+    from app.services.cache import PAST_INSIGHTS_LIMIT
+    user_id = "test_bounded_history_user"
+    
+    for i in range(PAST_INSIGHTS_LIMIT + 2):
+        await cache_service.record_user_insight(user_id, "Leo", f"Insight {i}")
+    
+    response = await async_client.get(f"/user/{user_id}")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["insights_count"] == PAST_INSIGHTS_LIMIT + 2
+    assert len(data["past_insights"]) == PAST_INSIGHTS_LIMIT
+    assert data["past_insights"][0]["insight"] == "Insight 2"
+    assert data["past_insights"][-1]["insight"] == f"Insight {PAST_INSIGHTS_LIMIT + 1}"
+
+async def test_concurrent_misses_share_one_generation():
+    """Test that concurrent cache misses for one sign and reader trigger a single LLM call"""
+    from app.services.insight import generate_insight
+    await cache_service.clear_cache()
+    
+    async def slow_generate(**kwargs):
+        await asyncio.sleep(0.01)
+        return f"Insight for {kwargs['name']}"
+    
+    with patch("app.services.insight.llm_service.generate_insight", side_effect=slow_generate) as mock_generate:
+        shared = await asyncio.gather(*[generate_insight(name="Shared", zodiac="Virgo") for _ in range(3)])
+        assert mock_generate.call_count == 1
+        
+        # Different readers never share a personalized generation
+        separate = await asyncio.gather(*[
+            generate_insight(name=f"User{i}", zodiac="Libra") for i in range(3)
+        ])
+        assert mock_generate.call_count == 4
+    
+    assert [insight for insight, _, _ in shared] == ["Insight for Shared"] * 3
+    assert [insight for insight, _, _ in separate] == [f"Insight for User{i}" for i in range(3)]
+
+async def test_single_flight_follower_survives_leader_cancellation():
+    """Test that followers retry instead of inheriting a cancelled leader's cancellation"""
+    from app.services.cache import AsyncCacheService
+    cache = AsyncCacheService()
+    calls = 0
+    
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+    
+    leader = asyncio.create_task(cache.single_flight("key", factory))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(cache.single_flight("key", factory))
+    await asyncio.sleep(0)
+    leader.cancel()
+    
+    assert await follower == "result"
+    assert leader.cancelled()
+    assert calls == 2
+
+    # A cancelled follower stops waiting without cancelling the shared result
+    leader = asyncio.create_task(cache.single_flight("key", factory))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(cache.single_flight("key", factory))
+    await asyncio.sleep(0)
+    follower.cancel()
+
+    assert await leader == "result"
+    assert follower.cancelled()
+    assert calls == 3
+
+async def test_concurrent_translations_share_one_call():
+    """Test that concurrent identical translations make a single Cohere call"""
+    from types import SimpleNamespace
+    from app.services.translation import translation_service
+    
+    async def slow_chat(**kwargs):
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(text=" Anuvaad ")
+    
+    mock_client = AsyncMock()
+    mock_client.chat.side_effect = slow_chat
+    with patch("app.services.translation.get_client", return_value=mock_client):
+        results = await asyncio.gather(*[
+            translation_service.translate("Shared text to translate", "hi") for _ in range(5)
+        ])
+        # Later requests are served from the translation cache
+        assert await translation_service.translate("Shared text to translate", "hi") == "Anuvaad"
+    
+    assert mock_client.chat.call_count == 1
+    assert results == ["Anuvaad"] * 5
+
+async def test_caching_behavior(async_client):
     """Test that caching works correctly"""
     payload = {
         "name": "TestUser",
@@ -150,13 +388,13 @@ def test_caching_behavior():
     }
     
     # First request - may be cache miss
-    response1 = client.post("/predict", json=payload)
+    response1 = await async_client.post("/predict", json=payload)
     assert response1.status_code == 200
     data1 = response1.json()
     insight1 = data1["insight"]
     
     # Second request - should be cache hit (same zodiac, same day)
-    response2 = client.post("/predict", json=payload)
+    response2 = await async_client.post("/predict", json=payload)
     assert response2.status_code == 200
     data2 = response2.json()
     insight2 = data2["insight"]
@@ -165,13 +403,74 @@ def test_caching_behavior():
     assert insight1 == insight2
     # Note: cache_hit may not be True for first request if cache was empty
 
-@patch('app.services.llm_service.llm_service.client')
-def test_llm_fallback(mock_openai_client):
+async def test_second_request_is_cache_hit(async_client):
+    """Test that a repeated same-day request is served from cache"""
+    await async_client.delete("/cache")
+    payload = {
+        "name": "TestUser",
+        "birth_date": "1990-04-01",
+        "birth_time": "12:00",
+        "birth_place": "Test City"
+    }
+    
+    response1 = await async_client.post("/predict", json=payload)
+    assert response1.status_code == 200
+    assert response1.json()["cache_hit"] is False
+    
+    response2 = await async_client.post("/predict", json=payload)
+    assert response2.status_code == 200
+    data2 = response2.json()
+    assert data2["cache_hit"] is True
+    assert data2["insight"] == response1.json()["insight"]
+
+async def test_cached_insight_not_shared_between_users(async_client):
+    """Test that one user's cached insight is never served to another user"""
+    await async_client.delete("/cache")
+    alice = {
+        "name": "Alice",
+        "birth_date": "1990-04-01",
+        "birth_time": "12:00",
+        "birth_place": "Test City"
+    }
+    bob = {**alice, "name": "Bob"}
+    
+    response_alice = await async_client.post("/predict", json=alice)
+    assert "Alice" in response_alice.json()["insight"]
+    
+    response_bob = await async_client.post("/predict", json=bob)
+    assert response_bob.status_code == 200
+    data_bob = response_bob.json()
+    assert data_bob["cache_hit"] is False
+    assert "Alice" not in data_bob["insight"]
+    assert "Bob" in data_bob["insight"]
+    
+    # Same for users with profiles: Bob's history-based text stays his own
+    await async_client.post("/predict", json={**bob, "user_id": "bob_user"})
+    data_alice = (await async_client.post("/predict", json={**alice, "user_id": "alice_user"})).json()
+    assert "Bob" not in data_alice["insight"]
+
+async def test_anonymous_requests_cache_only_by_name(async_client):
+    """Test that generated user ids for anonymous requests add no daily entries"""
+    await async_client.delete("/cache")
+    for name in ("Anon1", "Anon2", "Anon3"):
+        payload = {
+            "name": name,
+            "birth_date": "1990-04-01",
+            "birth_time": "12:00",
+            "birth_place": "Test City"
+        }
+        assert (await async_client.post("/predict", json=payload)).status_code == 200
+    
+    assert sorted(audience for _, audience, _ in cache_service._daily) == [
+        ("name", "Anon1"), ("name", "Anon2"), ("name", "Anon3")
+    ]
+
+@patch('app.services.llm_service.get_client')
+async def test_llm_fallback(mock_get_client, async_client):
     """Test that fallback works when LLM fails"""
-    # Mock async OpenAI client to raise an error
-    mock_completion = AsyncMock()
-    mock_completion.create.side_effect = Exception("API Error")
-    mock_openai_client.chat.completions = mock_completion
+    # Mock the shared Cohere client to raise an error
+    mock_get_client.return_value = AsyncMock()
+    mock_get_client.return_value.chat.side_effect = Exception("API Error")
     
     payload = {
         "name": "TestUser",
@@ -181,7 +480,7 @@ def test_llm_fallback(mock_openai_client):
     }
     
     # Should still work with fallback
-    response = client.post("/predict", json=payload)
+    response = await async_client.post("/predict", json=payload)
     assert response.status_code == 200
     data = response.json()
     assert "insight" in data
@@ -192,21 +491,22 @@ if __name__ == "__main__":
     print("\nNote: Some tests require Redis and OpenAI API key to be configured.")
     print("Set REDIS_HOST, REDIS_PORT, and OPENAI_API_KEY in environment or .env file.\n")
     
+    async def run_tests():
+        async with make_client() as async_client:
+            await test_read_main(async_client)
+            await test_health_check(async_client)
+            await test_predict_insight(async_client)
+            await test_predict_insight_with_user_id(async_client)
+            await test_predict_insight_with_language(async_client)
+            await test_predict_insight_with_coordinates(async_client)
+            await test_cache_stats(async_client)
+            await test_clear_cache(async_client)
+            await test_multiple_zodiac_signs(async_client)
+            await test_caching_behavior(async_client)
+        await test_async_cache_operations()
+    
     try:
-        # Run synchronous tests
-        test_read_main()
-        test_health_check()
-        test_predict_insight()
-        test_predict_insight_with_user_id()
-        test_predict_insight_with_language()
-        test_predict_insight_with_coordinates()
-        test_cache_stats()
-        test_clear_cache()
-        test_multiple_zodiac_signs()
-        test_caching_behavior()
-        
-        # Run async test
-        asyncio.run(test_async_cache_operations())
+        asyncio.run(run_tests())
         
         print("✅ All tests passed!")
     except AssertionError as e: